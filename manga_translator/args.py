@@ -51,6 +51,15 @@ def dir_path(string):
 #         return string
 #     return _func
 
+def positive_int(string):
+    try:
+        value = int(string)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Invalid int value: "{string}"')
+    if value < 1:
+        raise argparse.ArgumentTypeError(f'Value has to be at least 1: "{string}"')
+    return value
+
 def translator_chain(string):
     try:
         return TranslatorChain(string)
@@ -104,6 +113,8 @@ g = parser.add_mutually_exclusive_group()
 g.add_argument('--use-gpu', action='store_true', help='Turn on/off gpu (auto switch between mps and cuda)')
 g.add_argument('--use-gpu-limited', action='store_true', help='Turn on/off gpu (excluding offline translator)')
 
+parser.add_argument('--torch-threads', default=None, type=positive_int, help='Amount of cpu threads used by pytorch. Defaults to 1 when using gpu without --use-gpu-limited and to the cpu count capped at 4 otherwise, to avoid oversubscribing cores.')
+
 parser.add_argument('--detector', default='default', type=str, choices=DETECTORS, help='Text detector used for creating a text mask from an image, DO NOT use craft for manga, it\'s not designed for it')
 parser.add_argument('--ocr', default='48px', type=str, choices=OCRS, help='Optical character recognition (OCR) model to use')
 parser.add_argument('--use-mocr-merge', action='store_true', help='Use bbox merge when Manga OCR inference.')
@@ -129,6 +140,8 @@ parser.add_argument('--text-threshold', default=0.5, type=float, help='Threshold
 parser.add_argument('--min-text-length', default=0, type=int, help='Minimum text length of a text region')
 parser.add_argument('--no-text-lang-skip', action='store_true', help='Dont skip text that is seemingly already in the target language.')
 parser.add_argument('--inpainting-size', default=2048, type=int, help='Size of image used for inpainting (too large will result in OOM)')
+parser.add_argument('--amp', action='store_true', help='Run detection and upscaling models under fp16 autocast when using cuda. Inpainting precision is set through --inpainting-precision.')
+parser.add_argument('--compile-models', action='store_true', help='Compile the detection and inpainting models with torch.compile when using cuda. The first images will take longer while the models are compiled.')
 parser.add_argument('--inpainting-precision', default='fp32', type=str, help='Inpainting precision for lama, use bf16 while you can.', choices=['fp32', 'fp16', 'bf16'])
 parser.add_argument('--colorization-size', default=576, type=int, help='Size of image used for colorization. Set to -1 to use full image size')
 parser.add_argument('--denoise-sigma', default=30, type=int, help='Used by colorizer and affects color strength, range from 0 to 255 (default 30). -1 turns it off.')
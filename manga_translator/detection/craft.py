@@ -19,7 +19,7 @@ from typing import List, Tuple
 from .default_utils.DBNet_resnet34 import TextDetection as TextDetectionDefault
 from .default_utils import imgproc, dbnet_utils, craft_utils
 from .common import OfflineDetector
-from ..utils import TextBlock, Quadrilateral, det_rearrange_forward
+from ..utils import TextBlock, Quadrilateral, det_rearrange_forward, amp_autocast
 from shapely.geometry import Polygon, MultiPoint
 from shapely import affinity
 
@@ -158,16 +158,16 @@ class CRAFTDetector(OfflineDetector):
         x = torch.from_numpy(x).permute(2, 0, 1)    # [h, w, c] to [c, h, w]
         x = x.unsqueeze(0).to(self.device)                # [c, h, w] to [b, c, h, w]
 
-        with torch.no_grad() :
+        with torch.inference_mode(), amp_autocast(self.device) :
             y, feature = self.model(x)
 
-        # make score and link map
-        score_text = y[0,:,:,0].cpu().data.numpy()
-        score_link = y[0,:,:,1].cpu().data.numpy()
+            # make score and link map
+            score_text = y[0,:,:,0].float().cpu().data.numpy()
+            score_link = y[0,:,:,1].float().cpu().data.numpy()
 
-        # refine link
-        y_refiner = self.model_refiner(y, feature)
-        score_link = y_refiner[0,:,:,0].cpu().data.numpy()
+            # refine link
+            y_refiner = self.model_refiner(y, feature)
+            score_link = y_refiner[0,:,:,0].float().cpu().data.numpy()
 
         # Post-processing
         boxes, polys = craft_utils.getDetBoxes(score_text, score_link, text_threshold, box_threshold, box_threshold, True)
@@ -12,7 +12,7 @@ from .ctd_utils.utils.db_utils import SegDetectorRepresenter
 from .ctd_utils.utils.imgproc_utils import letterbox
 from .ctd_utils.textmask import REFINEMASK_INPAINT, refine_mask
 from .common import OfflineDetector
-from ..utils import Quadrilateral, det_rearrange_forward
+from ..utils import Quadrilateral, det_rearrange_forward, amp_autocast
 
 def preprocess_img(img, input_size=(1024, 1024), device='cpu', bgr2rgb=True, half=False, to_tensor=True):
     if bgr2rgb:
@@ -108,9 +108,10 @@ class ComicTextDetector(OfflineDetector):
         if isinstance(self.model, TextDetBase):
             batch = einops.rearrange(batch.astype(np.float32) / 255., 'n h w c -> n c h w')
             batch = torch.from_numpy(batch).to(device)
-            _, mask, lines = self.model(batch)
-            mask = mask.detach().cpu().numpy()
-            lines = lines.detach().cpu().numpy()
+            with torch.inference_mode(), amp_autocast(device):
+                _, mask, lines = self.model(batch)
+                mask = mask.detach().float().cpu().numpy()
+                lines = lines.detach().float().cpu().numpy()
         elif isinstance(self.model, TextDetBaseDNN):
             mask_lst, line_lst = [], []
             for b in batch:
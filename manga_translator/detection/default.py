@@ -9,7 +9,7 @@ from typing import List, Tuple
 from .default_utils.DBNet_resnet34 import TextDetection as TextDetectionDefault
 from .default_utils import imgproc, dbnet_utils, craft_utils
 from .common import OfflineDetector
-from ..utils import TextBlock, Quadrilateral, det_rearrange_forward
+from ..utils import TextBlock, Quadrilateral, det_rearrange_forward, to_device, amp_autocast
 
 MODEL = None
 def det_batch_forward_default(batch: np.ndarray, device: str):
@@ -17,11 +17,12 @@ def det_batch_forward_default(batch: np.ndarray, device: str):
     if isinstance(batch, list):
         batch = np.array(batch)
     batch = einops.rearrange(batch.astype(np.float32) / 127.5 - 1.0, 'n h w c -> n c h w')
-    batch = torch.from_numpy(batch).to(device)
-    with torch.no_grad():
+    batch = to_device(torch.from_numpy(batch), device)
+    with torch.inference_mode(), amp_autocast(device):
         db, mask = MODEL(batch)
-        db = db.sigmoid().cpu().numpy()
-        mask = mask.cpu().numpy()
+        # Outputs may be half precision when running under autocast
+        db = db.float().sigmoid().cpu().numpy()
+        mask = mask.float().cpu().numpy()
     return db, mask
 
 class DefaultDetector(OfflineDetector):
@@ -47,6 +48,7 @@ class DefaultDetector(OfflineDetector):
         self.device = device
         if device == 'cuda' or device == 'mps':
             self.model = self.model.to(self.device)
+        self.model = self._compile(self.model, device)
         global MODEL
         MODEL = self.model
 
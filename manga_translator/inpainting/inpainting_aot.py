@@ -31,6 +31,7 @@ class AotInpainter(LamaMPEInpainter):
         self.device = device
         if device.startswith('cuda') or device == 'mps':
             self.model.to(device)
+        self.model = self._compile(self.model, device)
 
 
 def relu_nf(x):
@@ -12,7 +12,7 @@ import shutil
 from torch import Tensor
 
 from .common import OfflineInpainter
-from ..utils import resize_keep_aspect
+from ..utils import resize_keep_aspect, to_device
 
 
 TORCH_DTYPE_MAP = {
@@ -48,6 +48,7 @@ class LamaMPEInpainter(OfflineInpainter):
         self.device = device
         if device.startswith('cuda') or device == 'mps':
             self.model.to(device)
+        self.model = self._compile(self.model, device)
 
     async def _unload(self):
         del self.model
@@ -77,7 +78,9 @@ class LamaMPEInpainter(OfflineInpainter):
             image = cv2.resize(image, (new_w, new_h), interpolation = cv2.INTER_LINEAR)
             mask = cv2.resize(mask, (new_w, new_h), interpolation = cv2.INTER_LINEAR)
         self.logger.info(f'Inpainting resolution: {new_w}x{new_h}')
-        if isinstance(self.model, LamaFourier):
+        # The model might be wrapped by torch.compile
+        is_fourier = isinstance(getattr(self.model, '_orig_mod', self.model), LamaFourier)
+        if is_fourier:
             img_torch = torch.from_numpy(image).permute(2, 0, 1).unsqueeze_(0).float() / 255.
         else:
             img_torch = torch.from_numpy(image).permute(2, 0, 1).unsqueeze_(0).float() / 127.5 - 1.0
@@ -85,8 +88,8 @@ class LamaMPEInpainter(OfflineInpainter):
         mask_torch[mask_torch < 0.5] = 0
         mask_torch[mask_torch >= 0.5] = 1
         if self.device.startswith('cuda') or self.device == 'mps':
-            img_torch = img_torch.to(self.device)
-            mask_torch = mask_torch.to(self.device)
+            img_torch = to_device(img_torch, self.device)
+            mask_torch = to_device(mask_torch, self.device)
         with torch.no_grad():
             img_torch *= (1 - mask_torch)
             if not (self.device.startswith('cuda')):
@@ -104,7 +107,7 @@ class LamaMPEInpainter(OfflineInpainter):
                 with torch.autocast(device_type="cuda", dtype=precision):
                     img_inpainted_torch = self.model(img_torch, mask_torch)
 
-        if isinstance(self.model, LamaFourier):
+        if is_fourier:
             img_inpainted = (img_inpainted_torch.cpu().squeeze_(0).permute(1, 2, 0).numpy() * 255.).astype(np.uint8)
         else:
             img_inpainted = ((img_inpainted_torch.cpu().squeeze_(0).permute(1, 2, 0).numpy() + 1.0) * 127.5).astype(np.uint8)
@@ -130,6 +133,7 @@ class LamaLargeInpainter(LamaMPEInpainter):
         self.device = device
         if device.startswith('cuda') or device == 'mps':
             self.model.to(device)
+        self.model = self._compile(self.model, device)
 
 
 
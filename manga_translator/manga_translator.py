@@ -1,23 +1,23 @@
 import asyncio
 import base64
+import binascii
+import importlib
 import io
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2
-from aiohttp.web_middlewares import middleware
 from omegaconf import OmegaConf
 import langcodes
 import langdetect
-import requests
 import os
 import re
+import tempfile
 import torch
 import time
 import logging
 import numpy as np
 from PIL import Image
-from typing import List, Tuple, Union
-from aiohttp import web
-from marshmallow import Schema, fields, ValidationError
+from typing import Callable, List, Optional, Tuple, Union
 
 from manga_translator.utils.threading import Throttler
 
@@ -59,7 +59,7 @@ from .translators import (
 )
 from .colorization import dispatch as dispatch_colorization, prepare as prepare_colorization
 from .rendering import dispatch as dispatch_rendering, dispatch_eng_render
-from .save import save_result
+from .save import save_result, GIMPFormat
 
 # Will be overwritten by __main__.py if module is being run directly (with python -m)
 logger = logging.getLogger('manga_translator')
@@ -70,6 +70,40 @@ def set_main_logger(l):
     logger = l
 
 
+_turbo_jpeg = None
+_optional_modules = {}
+# Quality used for all jpeg encoders of the api, matches the opencv default
+_JPG_QUALITY = 95
+_JPG_PARAMS = (int(cv2.IMWRITE_JPEG_QUALITY), _JPG_QUALITY)
+
+
+def _import_optional(name: str):
+    """
+    Imports one of the optional speedup packages on first use, returns None if it is not installed.
+    """
+    if name not in _optional_modules:
+        try:
+            _optional_modules[name] = importlib.import_module(name)
+        except ImportError:
+            _optional_modules[name] = None
+    return _optional_modules[name]
+
+
+def _get_turbo_jpeg():
+    """
+    Returns a shared TurboJPEG codec or None if PyTurboJPEG or libjpeg-turbo is unavailable.
+    """
+    global _turbo_jpeg
+    turbojpeg = _import_optional('turbojpeg')
+    if _turbo_jpeg is None and turbojpeg is not None:
+        try:
+            _turbo_jpeg = turbojpeg.TurboJPEG()
+        except Exception:
+            # The python package is installed but the shared library could not be found
+            _turbo_jpeg = False
+    return _turbo_jpeg or None
+
+
 class TranslationInterrupt(Exception):
     """
     Can be raised from within a progress hook to prematurely terminate
@@ -79,10 +113,27 @@ class TranslationInterrupt(Exception):
 
 
 class MangaTranslator():
+    # Amount of images decoded ahead of time by `translate_path`
+    _PREFETCH_IMAGES = 4
+    # Results that may wait on the writer threads before translation waits for them
+    _MAX_PENDING_SAVES = 4
 
     def __init__(self, params: dict = None):
         self._progress_hooks = []
         self._add_logger_hook()
+        # Used for image decoding and encoding off the event loop
+        self._io_pool = ThreadPoolExecutor(max_workers=4)
+        # Saves results in the background while translating a folder, see `_save_translation`
+        self._writer = ThreadPoolExecutor(max_workers=2)
+        self._save_futures = None
+        # Writes verbose debug images without holding up the pipeline, see `_dump_debug`
+        self._debug_pool = ThreadPoolExecutor(max_workers=1)
+        # Scratch arrays reused across images, see `_get_buffer`
+        self._buffers = {}
+        # Loaded --gpt-config files keyed by path, holding (mtime, config)
+        self._gpt_config_cache = {}
+        # Model combinations that already went through `_prepare_models`
+        self._prepared_models = set()
 
         params = params or {}
         self.parse_init_params(params)
@@ -108,8 +159,21 @@ class MangaTranslator():
             raise Exception(
                 'CUDA or Metal compatible device could not be found in torch whilst --use-gpu args was set.\n' \
                 'Is the correct pytorch version installed? (See https://pytorch.org/)')
+        # Too many intra-op threads make concurrent translators fight over the cores and when running
+        # on gpu the cpu side only dispatches kernels (except for the offline translators with --use-gpu-limited)
+        torch_threads = params.get('torch_threads')
+        if torch_threads is None:
+            torch_threads = 1 if self.using_gpu and not self._gpu_limited_memory else min(4, os.cpu_count() or 1)
+        torch.set_num_threads(torch_threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Can only be set once and before any inter-op parallel work has started
+            pass
         if params.get('model_dir'):
             ModelWrapper._MODEL_DIR = params.get('model_dir')
+        ModelWrapper._COMPILE_MODELS = params.get('compile_models', False)
+        ModelWrapper._AMP = params.get('amp', False)
         self.kernel_size=int(params.get('kernel_size'))
         os.environ['INPAINTING_PRECISION'] = params.get('inpainting_precision', 'fp32')
 
@@ -117,6 +181,33 @@ class MangaTranslator():
     def using_gpu(self):
         return self.device.startswith('cuda') or self.device == 'mps'
 
+    def _get_buffer(self, name: str, shape: Tuple[int, ...], dtype=np.uint8) -> np.ndarray:
+        """
+        Returns an uninitialized array of the given shape backed by a buffer that is kept between images
+        and only grows when a larger image comes along. The content is only valid until the next call with
+        the same name, so it must not be used for anything that outlives the current stage.
+        """
+        size = int(np.prod(shape))
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.dtype != dtype or buffer.size < size:
+            buffer = self._buffers[name] = np.empty(size, dtype=dtype)
+        return buffer[:size].reshape(shape)
+
+    def _dump_debug(self, name: str, img: np.ndarray, cvt: int = None):
+        """
+        Writes a debug image into the result folder on the debug thread. The image is converted or
+        copied first, so the caller is free to keep modifying it.
+        """
+        img = cv2.cvtColor(img, cvt) if cvt is not None else img.copy()
+        self._debug_pool.submit(self._write_debug, self._result_path(name), img)
+
+    @staticmethod
+    def _write_debug(path: str, img: np.ndarray):
+        try:
+            cv2.imwrite(path, img)
+        except Exception as e:
+            logger.warn(f'Failed to write debug image "{path}": {e}')
+
     async def translate_path(self, path: str, dest: str = None, params: dict = None):
         """
         Translates an image or folder (recursively) specified through the path.
@@ -161,28 +252,71 @@ class MangaTranslator():
             if os.path.exists(_dest) and not os.path.isdir(_dest):
                 raise FileExistsError(_dest)
 
+            # Images are decoded ahead of time by `_prefetch_images` while the current one is translated
+            queue = asyncio.Queue(maxsize=self._PREFETCH_IMAGES)
+            producer = asyncio.create_task(self._prefetch_images(path, _dest, file_ext, params, queue))
             translated_count = 0
+            self._save_futures = []
+            try:
+                while (item := await queue.get()) is not None:
+                    # Decode is None for text files and already translated images
+                    file_path, output_dest, decode = item
+                    img = None
+                    if decode is not None:
+                        try:
+                            img = await decode
+                        except Exception:
+                            # Let `translate_file` report the failure
+                            pass
+                    if await self.translate_file(file_path, output_dest, params, img):
+                        translated_count += 1
+                    translated_count -= await self._collect_saves()
+                translated_count -= await self._collect_saves(wait=True)
+            except BaseException:
+                producer.cancel()
+                # Another error is already on its way up, so failed saves are only logged
+                await self._collect_saves(wait=True, raise_errors=False)
+                raise
+            finally:
+                self._save_futures = None
+            await producer
+            if translated_count == 0:
+                logger.info('No further untranslated files found. Use --overwrite to write over existing translations.')
+            else:
+                logger.info(f'Done. Translated {translated_count} image{"" if translated_count == 1 else "s"}')
+
+    async def _prefetch_images(self, path: str, dest: str, file_ext: str, params: dict, queue: asyncio.Queue):
+        """
+        Walks the folder and pushes (path, dest, decode) items onto the queue in walk order. Decode is
+        the io thread pool future of an image that still needs to be translated, so up to a full queue
+        of images is decoded concurrently. It is None for files that should go through `translate_file`
+        unchanged. Ends with a None item.
+        """
+        loop = asyncio.get_running_loop()
+        try:
             for root, subdirs, files in os.walk(path):
                 files = natural_sort(files)
-                dest_root = replace_prefix(root, path, _dest)
+                dest_root = replace_prefix(root, path, dest)
                 os.makedirs(dest_root, exist_ok=True)
                 for f in files:
                     if f.lower() == '.thumb':
                         continue
 
                     file_path = os.path.join(root, f)
-                    output_dest = replace_prefix(file_path, path, _dest)
+                    output_dest = replace_prefix(file_path, path, dest)
                     p, ext = os.path.splitext(output_dest)
                     output_dest = f'{p}.{file_ext or ext[1:]}'
 
-                    if await self.translate_file(file_path, output_dest, params):
-                        translated_count += 1
-            if translated_count == 0:
-                logger.info('No further untranslated files found. Use --overwrite to write over existing translations.')
-            else:
-                logger.info(f'Done. Translated {translated_count} image{"" if translated_count == 1 else "s"}')
+                    decode = None
+                    if not file_path.endswith('.txt') and (params.get('overwrite') or not os.path.exists(output_dest)):
+                        decode = loop.run_in_executor(self._io_pool, self._load_image, file_path)
+                    await queue.put((file_path, output_dest, decode))
+        except Exception:
+            await queue.put(None)
+            raise
+        await queue.put(None)
 
-    async def translate_file(self, path: str, dest: str, params: dict):
+    async def translate_file(self, path: str, dest: str, params: dict, image: Image.Image = None):
         if not params.get('overwrite') and os.path.exists(dest):
             logger.info(
                 f'Skipping as already translated: "{dest}". Use --overwrite to overwrite existing translations.')
@@ -202,7 +336,7 @@ class MangaTranslator():
                 logger.info(f'Retrying translation! Attempt {attempts}'
                             + (f' of {ctx.attempts}' if ctx.attempts != -1 else ''))
             try:
-                return await self._translate_file(path, dest, ctx)
+                return await self._translate_file(path, dest, ctx, image)
 
             except TranslationInterrupt:
                 break
@@ -219,7 +353,7 @@ class MangaTranslator():
             attempts += 1
         return False
 
-    async def _translate_file(self, path: str, dest: str, ctx: Context):
+    async def _translate_file(self, path: str, dest: str, ctx: Context, image: Image.Image = None):
         if path.endswith('.txt'):
             with open(path, 'r') as f:
                 queries = f.read().split('\n')
@@ -237,38 +371,97 @@ class MangaTranslator():
         # TODO: Add .gif handler
 
         else:  # Treat as image
-            try:
-                img = Image.open(path)
-                img.verify()
-                img = Image.open(path)
-            except Exception:
-                logger.warn(f'Failed to open image: {path}')
+            img = image if image is not None else self._open_image(path)
+            if img is None:
                 return False
 
+            # Only the gimp exporter needs the clean inpainted image as a layer
+            _, ext = os.path.splitext(dest)
+            ctx.gimp_mask_needed = ext[1:] in GIMPFormat.SUPPORTED_FORMATS
             ctx = await self.translate(img, ctx)
-            result = ctx.result
-
-            # Save result
-            if ctx.skip_no_text and not ctx.text_regions:
-                logger.debug('Not saving due to --skip-no-text')
-                return True
-            if result:
-                logger.info(f'Saving "{dest}"')
-                save_result(result, dest, ctx)
+            return await self._save_translation(path, dest, img, ctx)
+
+    def _load_image(self, path: str) -> Image.Image:
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        # libjpeg-turbo decodes jpeg pages a lot faster than pillow
+        turbo_jpeg = _get_turbo_jpeg() if data[:3] == b'\xff\xd8\xff' else None
+        if turbo_jpeg is not None:
+            try:
+                from turbojpeg import TJPF_RGB
+                return Image.fromarray(turbo_jpeg.decode(data, pixel_format=TJPF_RGB))
+            except Exception:
+                # e.g. CMYK or corrupt jpegs, let pillow deal with them
+                pass
+
+        # Decoding raises on corrupt data as well, so no separate verify pass and second open are needed
+        img = Image.open(io.BytesIO(data))
+        img.load()
+        return img
+
+    def _open_image(self, path: str) -> Image.Image:
+        try:
+            return self._load_image(path)
+        except Exception:
+            logger.warn(f'Failed to open image: {path}')
+            return None
+
+    async def _save_translation(self, path: str, dest: str, img: Image.Image, ctx: Context) -> bool:
+        result = ctx.result
+
+        # Save result
+        if ctx.skip_no_text and not ctx.text_regions:
+            logger.debug('Not saving due to --skip-no-text')
+            return True
+        if result:
+            logger.info(f'Saving "{dest}"')
+            # Encode on the writer threads so the next image can be translated in the meantime.
+            # While translating a folder the save is only awaited at the end of `translate_path`.
+            save = asyncio.get_running_loop().run_in_executor(self._writer, save_result, result, dest, ctx)
+            if self._save_futures is not None:
+                # Reported as saved by `_collect_saves` once the file is written
+                self._save_futures.append((save, dest))
+            else:
+                await save
                 await self._report_progress('saved', True)
 
-                if ctx.save_text or ctx.save_text_file or ctx.prep_manual:
-                    if ctx.prep_manual:
-                        # Save original image next to translated
-                        p, ext = os.path.splitext(dest)
-                        img_filename = p + '-orig' + ext
-                        img_path = os.path.join(os.path.dirname(dest), img_filename)
-                        img.save(img_path, quality=ctx.save_quality)
-                    if ctx.text_regions:
-                        self._save_text_to_file(path, ctx)
-                return True
+            if ctx.save_text or ctx.save_text_file or ctx.prep_manual:
+                if ctx.prep_manual:
+                    # Save original image next to translated
+                    p, ext = os.path.splitext(dest)
+                    img_filename = p + '-orig' + ext
+                    img_path = os.path.join(os.path.dirname(dest), img_filename)
+                    img.save(img_path, quality=ctx.save_quality)
+                if ctx.text_regions:
+                    self._save_text_to_file(path, ctx)
+            return True
         return False
 
+    async def _collect_saves(self, wait: bool = False, raise_errors: bool = True) -> int:
+        """
+        Reports the finished background saves started by `_save_translation` and returns the amount that failed.
+        Waits for all of them with `wait`, otherwise only while too many results are kept in memory.
+        The first failure is raised unless --ignore-errors is set.
+        """
+        pending = [f for f, _ in self._save_futures if not f.done()]
+        if pending and (wait or len(pending) > self._MAX_PENDING_SAVES):
+            await asyncio.wait(pending, return_when=asyncio.ALL_COMPLETED if wait else asyncio.FIRST_COMPLETED)
+
+        done = [(f, d) for f, d in self._save_futures if f.done()]
+        self._save_futures = [(f, d) for f, d in self._save_futures if not f.done()]
+        errors = []
+        for save, dest in done:
+            e = save.exception() if not save.cancelled() else asyncio.CancelledError()
+            if e is None:
+                await self._report_progress('saved', True)
+            else:
+                logger.error(f'Failed to save "{dest}": {e.__class__.__name__}: {e}')
+                errors.append(e)
+        if errors and raise_errors and not self.ignore_errors:
+            raise errors[0]
+        return len(errors)
+
     async def translate(self, image: Image.Image, params: Union[dict, Context] = None) -> Context:
         """
         Translates a PIL image from a manga. Returns dict with result and intermediates of translation.
@@ -291,18 +484,37 @@ class MangaTranslator():
         ctx.input = image
         ctx.result = None
 
+        await self._prepare_models(ctx)
+        # translate
+        return await self._translate(ctx)
+
+    async def _prepare_models(self, ctx: Context):
         # preload and download models (not strictly necessary, remove to lazy load)
+        models = (ctx.upscaler if ctx.upscale_ratio else None, ctx.detector, ctx.ocr, ctx.inpainter,
+                  tuple(ctx.translator.chain), ctx.colorizer)
+        if models in self._prepared_models:
+            return
         logger.info('Loading models')
+        # Downloads and hash checks run on worker threads, so the models are fetched concurrently
+        preparations = [
+            prepare_detection(ctx.detector),
+            prepare_ocr(ctx.ocr, self.device),
+            prepare_inpainting(ctx.inpainter, self.device),
+            prepare_translation(ctx.translator),
+        ]
         if ctx.upscale_ratio:
-            await prepare_upscaling(ctx.upscaler)
-        await prepare_detection(ctx.detector)
-        await prepare_ocr(ctx.ocr, self.device)
-        await prepare_inpainting(ctx.inpainter, self.device)
-        await prepare_translation(ctx.translator)
+            preparations.append(prepare_upscaling(ctx.upscaler))
         if ctx.colorizer:
-            await prepare_colorization(ctx.colorizer)
-        # translate
-        return await self._translate(ctx)
+            preparations.append(prepare_colorization(ctx.colorizer))
+        tasks = [asyncio.ensure_future(preparation) for preparation in preparations]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # gather leaves the other preparations running, stop their downloads on the first error
+            for task in tasks:
+                task.cancel()
+            raise
+        self._prepared_models.add(models)
 
     def _preprocess_params(self, ctx: Context):
         # params auto completion
@@ -338,10 +550,11 @@ class MangaTranslator():
             ctx.translator = ctx.translator_chain
         else:
             ctx.translator = TranslatorChain(f'{ctx.translator}:{ctx.target_lang}')
-        if ctx.gpt_config:
-            ctx.gpt_config = OmegaConf.load(ctx.gpt_config)
+        if ctx.gpt_config and isinstance(ctx.gpt_config, str):
+            ctx.gpt_config = self._load_gpt_config(ctx.gpt_config)
 
-        if ctx.filter_text:
+        if ctx.filter_text and isinstance(ctx.filter_text, str):
+            # re keeps a bounded cache of compiled patterns, repeated client patterns are not recompiled
             ctx.filter_text = re.compile(ctx.filter_text)
 
         if ctx.font_color:
@@ -352,6 +565,14 @@ class MangaTranslator():
             except:
                 raise Exception(f'Invalid --font-color value: {ctx.font_color}. Use a hex value such as FF0000')
 
+    def _load_gpt_config(self, path: str):
+        # Only read the file again if it changed since the last request
+        mtime = os.stat(path).st_mtime
+        cached = self._gpt_config_cache.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = self._gpt_config_cache[path] = (mtime, OmegaConf.load(path))
+        return cached[1]
+
     async def _translate(self, ctx: Context) -> Context:
 
         # -- Colorization
@@ -376,7 +597,7 @@ class MangaTranslator():
         await self._report_progress('detection')
         ctx.textlines, ctx.mask_raw, ctx.mask = await self._run_detection(ctx)
         if self.verbose:
-            cv2.imwrite(self._result_path('mask_raw.png'), ctx.mask_raw)
+            self._dump_debug('mask_raw.png', ctx.mask_raw)
 
         if not ctx.textlines:
             await self._report_progress('skip-no-regions', True)
@@ -385,10 +606,11 @@ class MangaTranslator():
             return await self._revert_upscale(ctx)
 
         if self.verbose:
-            img_bbox_raw = np.copy(ctx.img_rgb)
+            img_bbox_raw = self._get_buffer('bboxes', ctx.img_rgb.shape)
+            np.copyto(img_bbox_raw, ctx.img_rgb)
             for txtln in ctx.textlines:
                 cv2.polylines(img_bbox_raw, [txtln.pts], True, color=(255, 0, 0), thickness=2)
-            cv2.imwrite(self._result_path('bboxes_unfiltered.png'), cv2.cvtColor(img_bbox_raw, cv2.COLOR_RGB2BGR))
+            self._dump_debug('bboxes_unfiltered.png', img_bbox_raw, cv2.COLOR_RGB2BGR)
 
         # -- OCR
         await self._report_progress('ocr')
@@ -418,7 +640,7 @@ class MangaTranslator():
 
         if self.verbose:
             bboxes = visualize_textblocks(cv2.cvtColor(ctx.img_rgb, cv2.COLOR_BGR2RGB), ctx.text_regions)
-            cv2.imwrite(self._result_path('bboxes.png'), bboxes)
+            self._dump_debug('bboxes.png', bboxes)
 
         # -- Translation
         await self._report_progress('translating')
@@ -444,17 +666,20 @@ class MangaTranslator():
         if self.verbose:
             inpaint_input_img = await dispatch_inpainting('none', ctx.img_rgb, ctx.mask, ctx.inpainting_size,
                                                           self.using_gpu, self.verbose)
-            cv2.imwrite(self._result_path('inpaint_input.png'), cv2.cvtColor(inpaint_input_img, cv2.COLOR_RGB2BGR))
-            cv2.imwrite(self._result_path('mask_final.png'), ctx.mask)
+            self._dump_debug('inpaint_input.png', inpaint_input_img, cv2.COLOR_RGB2BGR)
+            self._dump_debug('mask_final.png', ctx.mask)
 
         # -- Inpainting
         await self._report_progress('inpainting')
         ctx.img_inpainted = await self._run_inpainting(ctx)
 
-        ctx.gimp_mask = np.dstack((cv2.cvtColor(ctx.img_inpainted, cv2.COLOR_RGB2BGR), ctx.mask))
-
         if self.verbose:
-            cv2.imwrite(self._result_path('inpainted.png'), cv2.cvtColor(ctx.img_inpainted, cv2.COLOR_RGB2BGR))
+            self._dump_debug('inpainted.png', ctx.img_inpainted, cv2.COLOR_RGB2BGR)
+
+        # Built before rendering, which draws the text into img_inpainted in place.
+        # Only skipped when the caller knows the result won't be saved as xcf/psd/pdf.
+        if ctx.gimp_mask_needed is not False:
+            ctx.gimp_mask = np.dstack((cv2.cvtColor(ctx.img_inpainted, cv2.COLOR_RGB2BGR), ctx.mask))
 
         # -- Rendering
         await self._report_progress('rendering')
@@ -470,7 +695,11 @@ class MangaTranslator():
     async def _revert_upscale(self, ctx: Context):
         if ctx.revert_upscaling:
             await self._report_progress('downscaling')
-            ctx.result = ctx.result.resize(ctx.input.size)
+            if ctx.result.size != ctx.input.size and ctx.result.mode in ('L', 'RGB', 'RGBA'):
+                # opencv's area interpolation is both faster and better suited for downscaling than pillow's bicubic
+                ctx.result = Image.fromarray(cv2.resize(np.asarray(ctx.result), ctx.input.size, interpolation=cv2.INTER_AREA))
+            elif ctx.result.size != ctx.input.size:
+                ctx.result = ctx.result.resize(ctx.input.size)
 
         return ctx
 
@@ -523,35 +752,63 @@ class MangaTranslator():
         return text_regions
 
     async def _run_text_translation(self, ctx: Context):
+        texts = [region.text for region in ctx.text_regions]
         translated_sentences = \
             await dispatch_translation(ctx.translator,
-                                       [region.text for region in ctx.text_regions],
+                                       texts,
                                        ctx.use_mtpe,
                                        ctx, 'cpu' if self._gpu_limited_memory else self.device)
 
-        for region, translation in zip(ctx.text_regions, translated_sentences):
-            if ctx.uppercase:
-                translation = translation.upper()
-            elif ctx.lowercase:
-                translation = translation.upper()
+        case_fn = self._case_fn(ctx)
+        target_lang, alignment, direction = ctx.target_lang, ctx.alignment, ctx.direction
+        # Regions are filtered out by their translations in the same pass
+        keep_all = ctx.translator == 'none'
+        filter_search = ctx.filter_text.search if ctx.filter_text else None
+        compare_source = not ctx.translator == 'original'
+        new_text_regions = []
+        for region, text, translation in zip(ctx.text_regions, texts, translated_sentences):
+            if case_fn:
+                translation = case_fn(translation)
             region.translation = translation
-            region.target_lang = ctx.target_lang
-            region._alignment = ctx.alignment
-            region._direction = ctx.direction
+            region.target_lang = target_lang
+            region._alignment = alignment
+            region._direction = direction
 
-        # Filter out regions by their translations
-        new_text_regions = []
-        for region in ctx.text_regions:
+            if keep_all:
+                new_text_regions.append(region)
+                continue
             # TODO: Maybe print reasons for filtering
-            if not ctx.translator == 'none' and (region.translation.isnumeric() \
-                    or ctx.filter_text and re.search(ctx.filter_text, region.translation)
-                    or not ctx.translator == 'original' and region.text.lower().strip() == region.translation.lower().strip()):
-                if region.translation.strip():
-                    logger.info(f'Filtered out: {region.translation}')
-            else:
+            keep, stripped = self._should_keep(translation, text, filter_search, compare_source)
+            if keep:
                 new_text_regions.append(region)
+            elif stripped:
+                logger.info(f'Filtered out: {translation}')
         return new_text_regions
 
+    @staticmethod
+    def _case_fn(ctx: Context) -> Optional[Callable[[str], str]]:
+        """
+        Returns the function applying --uppercase/--lowercase to translations, or None to keep them as is.
+        """
+        if ctx.uppercase:
+            return str.upper
+        if ctx.lowercase:
+            return str.lower
+        return None
+
+    @staticmethod
+    def _should_keep(text: str, source: str, filter_search=None, compare_source: bool = True) -> Tuple[bool, str]:
+        """
+        Checks a translation against the region filters, cheapest check first.
+        Returns whether to keep it along with its stripped form.
+        """
+        stripped = text.strip()
+        if text.isnumeric() \
+                or compare_source and source.strip().lower() == stripped.lower() \
+                or filter_search and filter_search(text):
+            return False, stripped
+        return True, stripped
+
     async def _run_mask_refinement(self, ctx: Context):
         return await dispatch_mask_refinement(ctx.text_regions, ctx.img_rgb, ctx.mask_raw, 'fit_text',
                                               ctx.mask_dilation_offset, ctx.ignore_bubble, self.verbose,self.kernel_size)
@@ -620,19 +877,21 @@ class MangaTranslator():
         self.add_progress_hook(ph)
 
     def _save_text_to_file(self, image_path: str, ctx: Context):
-        cached_colors = []
+        cached_rgb = np.empty((0, 3), dtype=np.int16)
+        cached_names = []
 
         def identify_colors(fg_rgb: List[int]):
-            idx = 0
-            for rgb, _ in cached_colors:
-                # If similar color already saved
-                if abs(rgb[0] - fg_rgb[0]) + abs(rgb[1] - fg_rgb[1]) + abs(rgb[2] - fg_rgb[2]) < 50:
-                    break
-                else:
-                    idx += 1
+            nonlocal cached_rgb
+            fg = np.asarray(fg_rgb, dtype=np.int16)
+            # L1 distance to every saved color at once, reuse the first similar one
+            similar = np.flatnonzero(np.abs(cached_rgb - fg).sum(axis=1) < 50)
+            if similar.size:
+                idx = int(similar[0])
             else:
-                cached_colors.append((fg_rgb, get_color_name(fg_rgb)))
-            return idx + 1, cached_colors[idx][1]
+                idx = len(cached_names)
+                cached_rgb = np.vstack((cached_rgb, fg))
+                cached_names.append(get_color_name(fg_rgb))
+            return idx + 1, cached_names[idx]
 
         s = f'\n[{image_path}]\n'
         for i, region in enumerate(ctx.text_regions):
@@ -670,6 +929,13 @@ class MangaTranslatorWeb(MangaTranslator):
         self.ignore_errors = params.get('ignore_errors', True)
         self._task_id = None
         self._params = None
+        self._http = None
+
+    async def _post(self, path: str, data: dict, timeout: float = None):
+        from aiohttp import ClientTimeout
+        async with self._http.post(f'http://{self.host}:{self.port}{path}', json=data,
+                                   timeout=ClientTimeout(total=timeout)) as resp:
+            return await resp.json()
 
     async def _init_connection(self):
         available_translators = []
@@ -687,7 +953,7 @@ class MangaTranslatorWeb(MangaTranslator):
                 'translators': available_translators,
             },
         }
-        requests.post(f'http://{self.host}:{self.port}/connect-internal', json=data)
+        await self._post('/connect-internal', data)
 
     async def _send_state(self, state: str, finished: bool):
         # wait for translation to be saved first (bad solution?)
@@ -700,7 +966,7 @@ class MangaTranslatorWeb(MangaTranslator):
                     'state': state,
                     'finished': finished,
                 }
-                requests.post(f'http://{self.host}:{self.port}/task-update-internal', json=data, timeout=20)
+                await self._post('/task-update-internal', data, timeout=20)
                 break
             except Exception:
                 # if translation is finished server has to know
@@ -709,10 +975,12 @@ class MangaTranslatorWeb(MangaTranslator):
                 else:
                     break
 
-    def _get_task(self):
+    async def _get_task(self):
+        from aiohttp import ClientTimeout
         try:
-            rjson = requests.get(f'http://{self.host}:{self.port}/task-internal?nonce={self.nonce}',
-                                 timeout=3600).json()
+            async with self._http.get(f'http://{self.host}:{self.port}/task-internal', params={'nonce': self.nonce},
+                                      timeout=ClientTimeout(total=3600)) as resp:
+                rjson = await resp.json()
             return rjson.get('task_id'), rjson.get('data')
         except Exception:
             return None, None
@@ -723,11 +991,17 @@ class MangaTranslatorWeb(MangaTranslator):
         """
         logger.info('Waiting for translation tasks')
 
+        from aiohttp import ClientSession
+        async with ClientSession() as self._http:
+            await self._listen(translation_params)
+        self._http = None
+
+    async def _listen(self, translation_params: dict = None):
         await self._init_connection()
         self.add_progress_hook(self._send_state)
 
         while True:
-            self._task_id, self._params = self._get_task()
+            self._task_id, self._params = await self._get_task()
             if self._params and 'exit' in self._params:
                 break
             if not (self._task_id and self._params):
@@ -763,7 +1037,7 @@ class MangaTranslatorWeb(MangaTranslator):
 
         if ctx.get('manual', False):
             logger.info('Waiting for user input from manual translation')
-            requests.post(f'http://{self.host}:{self.port}/request-manual-internal', json={
+            await self._post('/request-manual-internal', {
                 'task_id': self._task_id,
                 'nonce': self.nonce,
                 'texts': [r.text for r in text_regions],
@@ -773,10 +1047,10 @@ class MangaTranslatorWeb(MangaTranslator):
             # wait for at most 1 hour for manual translation
             wait_until = time.time() + 3600
             while time.time() < wait_until:
-                ret = requests.post(f'http://{self.host}:{self.port}/get-manual-result-internal', json={
+                ret = await self._post('/get-manual-result-internal', {
                     'task_id': self._task_id,
                     'nonce': self.nonce
-                }, timeout=20).json()
+                }, timeout=20)
                 if 'result' in ret:
                     manual_translations = ret['result']
                     if isinstance(manual_translations, str):
@@ -921,7 +1195,7 @@ class MangaTranslatorWS(MangaTranslator):
                 img = io.BytesIO()
                 output.save(img, format='PNG')
                 if self.verbose:
-                    output.save(self._result_path('ws_final.png'))
+                    self._debug_pool.submit(output.save, self._result_path('ws_final.png'))
 
                 img_bytes = img.getvalue()
                 logger_task.info(f'-- Uploading result to {task.translation_mask}')
@@ -1031,28 +1305,81 @@ class MangaTranslatorWS(MangaTranslator):
             return result
 
     async def _run_text_rendering(self, ctx: Context):
-        render_mask = (ctx.mask >= 127).astype(np.uint8)[:, :, None]
-
         output = await super()._run_text_rendering(ctx)
-        render_mask[np.sum(ctx.img_rgb != output, axis=2) > 0] = 1
+        render_mask = _ws_render_mask(ctx.mask, ctx.img_rgb, output,
+                                      self._get_buffer('ws_diff', output.shape, bool),
+                                      self._get_buffer('ws_changed', output.shape[:2], bool))
         ctx.render_mask = render_mask
         if self.verbose:
-            cv2.imwrite(self._result_path('ws_render_in.png'), cv2.cvtColor(ctx.img_rgb, cv2.COLOR_RGB2BGR))
-            cv2.imwrite(self._result_path('ws_render_out.png'), cv2.cvtColor(output, cv2.COLOR_RGB2BGR))
-            cv2.imwrite(self._result_path('ws_mask.png'), render_mask * 255)
+            self._dump_debug('ws_render_in.png', ctx.img_rgb, cv2.COLOR_RGB2BGR)
+            self._dump_debug('ws_render_out.png', output, cv2.COLOR_RGB2BGR)
+            self._dump_debug('ws_mask.png', render_mask * 255)
+            self._dump_debug('ws_inmask.png', cv2.cvtColor(ctx.img_rgb, cv2.COLOR_RGB2BGRA) * render_mask)
 
         # only keep sections in mask
+        rgba = _ws_masked_rgba(output, render_mask)
         if self.verbose:
-            cv2.imwrite(self._result_path('ws_inmask.png'), cv2.cvtColor(ctx.img_rgb, cv2.COLOR_RGB2BGRA) * render_mask)
-        output = cv2.cvtColor(output, cv2.COLOR_RGB2RGBA) * render_mask
-        if self.verbose:
-            cv2.imwrite(self._result_path('ws_output.png'), cv2.cvtColor(output, cv2.COLOR_RGBA2BGRA) * render_mask)
+            self._dump_debug('ws_output.png', rgba, cv2.COLOR_RGBA2BGRA)
 
-        return output
+        return rgba
+
+
+def _ws_render_mask(mask: np.ndarray, img_rgb: np.ndarray, output: np.ndarray,
+                    diff: np.ndarray = None, changed: np.ndarray = None) -> np.ndarray:
+    """
+    Returns the (h, w, 1) uint8 mask of the text mask together with every pixel the renderer changed.
+    `diff` and `changed` are optional (h, w, 3) and (h, w) bool scratch arrays.
+    """
+    render_mask = np.greater_equal(mask, 127)
+    diff = np.not_equal(img_rgb, output, out=diff)
+    render_mask |= np.any(diff, axis=2, out=changed)
+    return render_mask.view(np.uint8)[:, :, None]
+
+def _ws_masked_rgba(output: np.ndarray, render_mask: np.ndarray) -> np.ndarray:
+    """
+    Same as `cv2.cvtColor(output, cv2.COLOR_RGB2RGBA) * render_mask`, but written straight into
+    the rgba result instead of converting and masking through temporary copies.
+    """
+    rgba = np.empty((*output.shape[:2], 4), dtype=np.uint8)
+    np.multiply(output, render_mask, out=rgba[:, :, :3], casting='unsafe')
+    np.multiply(render_mask[:, :, 0], 255, out=rgba[:, :, 3], casting='unsafe')
+    return rgba
+
+
+class _Base64ChunkDecoder:
+    """
+    Decodes base64 data arriving in chunks of any length. Whitespace is dropped and an
+    incomplete 4 character group is held back until the next chunk or `flush`.
+    """
+
+    def __init__(self):
+        self._pending = b''
+
+    def decode(self, chunk: bytes) -> bytes:
+        chunk = self._pending + b''.join(chunk.split())
+        cut = len(chunk) - len(chunk) % 4
+        self._pending = chunk[cut:]
+        return binascii.a2b_base64(chunk[:cut])
+
+    def flush(self) -> bytes:
+        pending, self._pending = self._pending, b''
+        return binascii.a2b_base64(pending) if pending else b''
+
+
+def _one_of(choices, normalize=str.lower):
+    """
+    Returns a schema validator accepting values that are in choices, comparing both normalized.
+    The choices are normalized into a frozenset once when the validator is created.
+    """
+    choices = frozenset(normalize(choice) for choice in choices)
+    return lambda value: normalize(value) in choices
 
 
 # Experimental. May be replaced by a refactored server/web_main.py in the future.
 class MangaTranslatorAPI(MangaTranslator):
+    _post_schema = None
+    _MAX_UPLOAD_SIZE = 1024 * 1024 * 50
+
     def __init__(self, params: dict = None):
         import nest_asyncio
         nest_asyncio.apply()
@@ -1065,6 +1392,8 @@ class MangaTranslatorAPI(MangaTranslator):
         self._params = None
         self.params = params
         self.queue = []
+        # Encodes the response images off the event loop, see `format_translate`
+        self._encode_pool = ThreadPoolExecutor(max_workers=os.cpu_count())
 
     async def wait_queue(self, id: int):
         while self.queue[0] != id:
@@ -1081,6 +1410,9 @@ class MangaTranslatorAPI(MangaTranslator):
         return x + 1
 
     def middleware_factory(self):
+        from aiohttp import web
+        from aiohttp.web_middlewares import middleware
+
         @middleware
         async def sample_middleware(request, handler):
             id = self.generate_id()
@@ -1088,7 +1420,7 @@ class MangaTranslatorAPI(MangaTranslator):
             try:
                 await self.wait_queue(id)
             except Exception as e:
-                print(e)
+                logger.error(f'{e.__class__.__name__}: {e}')
             try:
                 # todo make cancellable
                 response = await handler(request)
@@ -1099,40 +1431,109 @@ class MangaTranslatorAPI(MangaTranslator):
             try:
                 self.remove_from_queue(id)
             except Exception as e:
-                print(e)
+                logger.error(f'{e.__class__.__name__}: {e}')
             return response
 
         return sample_middleware
 
     async def get_file(self, image, base64Images, url) -> Image:
+        from aiohttp import web
+        from marshmallow import ValidationError
         if image is not None:
-            content = image.file.read()
+            # Only spooled multipart uploads are accepted, a plain string would be opened as a server side path
+            if not hasattr(image, 'read'):
+                raise ValidationError("image must be a file upload")
+            # Pillow reads straight from the spooled file without copying it into bytes first
+            source = image
         elif base64Images is not None:
-            base64Images = base64Images
-            if base64Images.__contains__('base64,'):
-                base64Images = base64Images.split('base64,')[1]
-            content = base64.b64decode(base64Images)
+            if 'base64,' in base64Images:
+                base64Images = base64Images.partition('base64,')[2]
+            source = io.BytesIO(binascii.a2b_base64(base64Images))
         elif url is not None:
             from aiohttp import ClientSession
             async with ClientSession() as session:
                 async with session.get(url) as resp:
                     if resp.status == 200:
-                        content = await resp.read()
+                        source = io.BytesIO(await resp.read())
                     else:
                         return web.json_response({'status': 'error'})
         else:
             raise ValidationError("donest exist")
-        img = Image.open(io.BytesIO(content))
+        try:
+            # Opening only parses the header, so oversized images are rejected before any pixels are decoded
+            img = Image.open(source)
+            if img.width * img.height > 8000 ** 2:
+                raise ValidationError("to large")
+            # Decoding raises on corrupt data as well, replacing the separate verify pass and second open
+            img.load()
+        finally:
+            source.close()
+        return img
 
-        img.verify()
-        img = Image.open(io.BytesIO(content))
-        if img.width * img.height > 8000 ** 2:
+    async def _read_json(self, req) -> dict:
+        """
+        Parses the json body while it streams in, so the raw body is not held in memory
+        next to the parsed fields and their base64 images.
+        """
+        # Without a declared length `req.json()` is kept as it enforces the upload limit while reading
+        ijson = _import_optional('ijson')
+        if ijson is None or req.content_length is None:
+            return await req.json()
+        if req.content_length > self._MAX_UPLOAD_SIZE:
+            from marshmallow import ValidationError
             raise ValidationError("to large")
-        return img
+        # The whole top level value is taken, so schema.load still rejects arrays and scalars as before
+        data = None
+        try:
+            async for data in ijson.items_async(req.content, '', use_float=True):
+                pass
+        except ijson.JSONError as e:
+            # Reported like the ValueError `req.json()` raises on malformed bodies
+            raise ValueError(str(e)) from e
+        return data
+
+    async def _read_multipart(self, req) -> dict:
+        """
+        Reads the form field by field. Uploaded files are spooled into temporary files
+        instead of buffering the whole request body in memory first.
+        """
+        from marshmallow import ValidationError
+        data = {}
+        size = 0
+        reader = await req.multipart()
+        async for field in reader:
+            if field.filename is None:
+                # `req.multipart()` bypasses client_max_size, so text fields count toward the same limit
+                parts = []
+                while chunk := await field.read_chunk():
+                    size += len(chunk)
+                    if size > self._MAX_UPLOAD_SIZE:
+                        raise ValidationError("to large")
+                    parts.append(chunk)
+                data[field.name] = field.decode(b''.join(parts)).decode(field.get_charset(default='utf-8'))
+                continue
+            # Raw binary parts are written as they arrive, base64 encoded parts are decoded chunk by chunk
+            is_base64 = field.headers.get('Content-Transfer-Encoding', '').lower() == 'base64'
+            decoder = _Base64ChunkDecoder() if is_base64 else None
+            file = tempfile.SpooledTemporaryFile(max_size=4 << 20)
+            while chunk := await field.read_chunk():
+                size += len(chunk)
+                if size > self._MAX_UPLOAD_SIZE:
+                    file.close()
+                    raise ValidationError("to large")
+                if decoder is not None:
+                    chunk = decoder.decode(chunk)
+                file.write(chunk)
+            if decoder is not None:
+                file.write(decoder.flush())
+            file.seek(0)
+            data[field.name] = file
+        return data
 
     async def listen(self, translation_params: dict = None):
+        from aiohttp import web
         self.params = translation_params
-        app = web.Application(client_max_size=1024 * 1024 * 50, middlewares=[self.middleware_factory()])
+        app = web.Application(client_max_size=self._MAX_UPLOAD_SIZE, middlewares=[self.middleware_factory()])
 
         routes = web.RouteTableDef()
         run_until_state = ''
@@ -1179,14 +1580,15 @@ class MangaTranslatorAPI(MangaTranslator):
         return await self.translate(img, translation_params)
 
     async def err_handling(self, func, req, format, ri=False):
+        from aiohttp import web
+        from marshmallow import ValidationError
         try:
             if req.content_type == 'application/json' or req.content_type == 'multipart/form-data':
                 if req.content_type == 'application/json':
-                    d = await req.json()
+                    d = await self._read_json(req)
                 else:
-                    d = await req.post()
-                schema = self.PostSchema()
-                data = schema.load(d)
+                    d = await self._read_multipart(req)
+                data = self._get_post_schema().load(d)
                 if 'translator_chain' in data:
                     data['translator_chain'] = translator_chain(data['translator_chain'])
                 if 'selective_translation' in data:
@@ -1213,29 +1615,32 @@ class MangaTranslatorAPI(MangaTranslator):
                     except TranslationInterrupt:
                         break
                     except Exception as e:
-                        print(e)
+                        logger.error(f'{e.__class__.__name__}: {e}', exc_info=e if self.verbose else None)
                     attempts += 1
                 if ctx.attempts != -1 and attempts > ctx.attempts:
                     return web.json_response({'error': "Internal Server Error", 'status': 500},
                                              status=500)
                 try:
-                    return format(ctx, ri)
+                    return await format(ctx, ri)
                 except Exception as e:
-                    print(e)
+                    logger.error(f'{e.__class__.__name__}: {e}', exc_info=e if self.verbose else None)
                     return web.json_response({'error': "Failed to format", 'status': 500},
                                              status=500)
             else:
                 return web.json_response({'error': "Wrong content type: " + req.content_type, 'status': 415},
                                          status=415)
         except ValueError as e:
-            print(e)
+            logger.error(f'{e.__class__.__name__}: {e}')
             return web.json_response({'error': "Wrong input type", 'status': 422}, status=422)
 
         except ValidationError as e:
-            print(e)
+            logger.error(f'{e.__class__.__name__}: {e}')
             return web.json_response({'error': "Input invalid", 'status': 422}, status=422)
 
-    def format_translate(self, ctx: Context, return_image: bool):
+    async def format_translate(self, ctx: Context, return_image: bool):
+        from aiohttp import web
+        loop = asyncio.get_running_loop()
+        encodes = []
         text_regions = ctx.text_regions
         inpaint = ctx.img_inpainted
         results = []
@@ -1243,24 +1648,16 @@ class MangaTranslatorAPI(MangaTranslator):
             overlay_ext = ctx['overlay_ext']
         else:
             overlay_ext = 'jpg'
+        translations = list(ctx['translations'].items()) if 'translations' in ctx else []
         for i, blk in enumerate(text_regions):
             minX, minY, maxX, maxY = blk.xyxy
-            if 'translations' in ctx:
-                trans = {key: value[i] for key, value in ctx['translations'].items()}
-            else:
-                trans = {}
-            trans["originalText"] = text_regions[i].text
+            trans = {key: value[i] for key, value in translations}
+            trans["originalText"] = blk.text
             if inpaint is not None:
-                overlay = inpaint[minY:maxY, minX:maxX]
-
-                retval, buffer = cv2.imencode('.' + overlay_ext, overlay)
-                jpg_as_text = base64.b64encode(buffer)
-                background = "data:image/" + overlay_ext + ";base64," + jpg_as_text.decode("utf-8")
-            else:
-                background = None
-            text_region = text_regions[i]
-            text_region.adjust_bg_color = False
-            color1, color2 = text_region.get_font_colors()
+                encodes.append(loop.run_in_executor(self._encode_pool, self._encode_image,
+                                                    inpaint[minY:maxY, minX:maxX], overlay_ext))
+            blk.adjust_bg_color = False
+            color1, color2 = blk.get_font_colors()
 
             results.append({
                 'text': trans,
@@ -1272,53 +1669,88 @@ class MangaTranslatorAPI(MangaTranslator):
                     'fg': color1.tolist(),
                     'bg': color2.tolist()
                 },
-                'language': text_regions[i].source_lang,
-                'background': background
+                'language': blk.source_lang,
+                'background': None
             })
         if return_image and ctx.img_colorized is not None:
-            retval, buffer = cv2.imencode('.' + overlay_ext, np.array(ctx.img_colorized))
-            jpg_as_text = base64.b64encode(buffer)
-            img = "data:image/" + overlay_ext + ";base64," + jpg_as_text.decode("utf-8")
-        else:
-            img = None
+            encodes.append(loop.run_in_executor(self._encode_pool, self._encode_image,
+                                                np.array(ctx.img_colorized), overlay_ext))
+        # The overlays are encoded in parallel while other requests keep being served
+        encoded = await asyncio.gather(*encodes)
+        if inpaint is not None:
+            for result, background in zip(results, encoded):
+                result['background'] = background
+        img = encoded[-1] if return_image and ctx.img_colorized is not None else None
+        orjson = _import_optional('orjson')
+        if orjson is not None:
+            # The response mostly consists of large base64 strings which orjson serializes a lot faster
+            return web.Response(body=orjson.dumps({'details': results, 'img': img}), content_type='application/json')
         return web.json_response({'details': results, 'img': img})
 
-    class PostSchema(Schema):
-        target_lang = fields.Str(required=False, validate=lambda a: a.upper() in VALID_LANGUAGES)
-        detector = fields.Str(required=False, validate=lambda a: a.lower() in DETECTORS)
-        ocr = fields.Str(required=False, validate=lambda a: a.lower() in OCRS)
-        inpainter = fields.Str(required=False, validate=lambda a: a.lower() in INPAINTERS)
-        upscaler = fields.Str(required=False, validate=lambda a: a.lower() in UPSCALERS)
-        translator = fields.Str(required=False, validate=lambda a: a.lower() in TRANSLATORS)
-        direction = fields.Str(required=False, validate=lambda a: a.lower() in {'auto', 'h', 'v'})
-        skip_language = fields.Str(required=False)
-        upscale_ratio = fields.Integer(required=False)
-        translator_chain = fields.Str(required=False)
-        selective_translation = fields.Str(required=False)
-        attempts = fields.Integer(required=False)
-        detection_size = fields.Integer(required=False)
-        text_threshold = fields.Float(required=False)
-        box_threshold = fields.Float(required=False)
-        unclip_ratio = fields.Float(required=False)
-        inpainting_size = fields.Integer(required=False)
-        det_rotate = fields.Bool(required=False)
-        det_auto_rotate = fields.Bool(required=False)
-        det_invert = fields.Bool(required=False)
-        det_gamma_correct = fields.Bool(required=False)
-        min_text_length = fields.Integer(required=False)
-        colorization_size = fields.Integer(required=False)
-        denoise_sigma = fields.Integer(required=False)
-        mask_dilation_offset = fields.Integer(required=False)
-        ignore_bubble = fields.Integer(required=False)
-        gpt_config = fields.String(required=False)
-        filter_text = fields.String(required=False)
-
-        # api specific
-        overlay_ext = fields.Str(required=False)
-        base64Images = fields.Raw(required=False)
-        image = fields.Raw(required=False)
-        url = fields.Raw(required=False)
-
-        # no functionality except preventing errors when given
-        fingerprint = fields.Raw(required=False)
-        clientUuid = fields.Raw(required=False)
+    @staticmethod
+    def _encode_image(img: np.ndarray, ext: str) -> str:
+        """
+        Encodes the image into a base64 data uri. Like `cv2.imencode` the channels are taken as BGR.
+        """
+        is_jpeg = ext in ('jpg', 'jpeg') and img.ndim == 3 and img.shape[2] == 3
+        simplejpeg = _import_optional('simplejpeg') if is_jpeg else None
+        if simplejpeg is not None:
+            # simplejpeg skips the intermediate numpy buffer and is noticeably faster for the many small overlays.
+            # Subsampling and dct are pinned to the opencv defaults so clients get the same images either way.
+            buffer = simplejpeg.encode_jpeg(np.ascontiguousarray(img), quality=_JPG_QUALITY, colorspace='BGR',
+                                            colorsubsampling='420', fastdct=False)
+        elif is_jpeg:
+            retval, buffer = cv2.imencode('.jpg', img, _JPG_PARAMS)
+        else:
+            retval, buffer = cv2.imencode('.' + ext, img)
+        return "data:image/" + ext + ";base64," + base64.b64encode(buffer).decode('ascii')
+
+    @classmethod
+    def _get_post_schema(cls):
+        # marshmallow is only needed by the api server, so it is imported on first use.
+        # The schema instance is kept since building one copies all of its fields.
+        if cls._post_schema is None:
+            from marshmallow import Schema, fields
+
+            class PostSchema(Schema):
+                target_lang = fields.Str(required=False, validate=_one_of(VALID_LANGUAGES, str.upper))
+                detector = fields.Str(required=False, validate=_one_of(DETECTORS))
+                ocr = fields.Str(required=False, validate=_one_of(OCRS))
+                inpainter = fields.Str(required=False, validate=_one_of(INPAINTERS))
+                upscaler = fields.Str(required=False, validate=_one_of(UPSCALERS))
+                translator = fields.Str(required=False, validate=_one_of(TRANSLATORS))
+                direction = fields.Str(required=False, validate=_one_of(('auto', 'h', 'v')))
+                skip_language = fields.Str(required=False)
+                upscale_ratio = fields.Integer(required=False)
+                translator_chain = fields.Str(required=False)
+                selective_translation = fields.Str(required=False)
+                attempts = fields.Integer(required=False)
+                detection_size = fields.Integer(required=False)
+                text_threshold = fields.Float(required=False)
+                box_threshold = fields.Float(required=False)
+                unclip_ratio = fields.Float(required=False)
+                inpainting_size = fields.Integer(required=False)
+                det_rotate = fields.Bool(required=False)
+                det_auto_rotate = fields.Bool(required=False)
+                det_invert = fields.Bool(required=False)
+                det_gamma_correct = fields.Bool(required=False)
+                min_text_length = fields.Integer(required=False)
+                colorization_size = fields.Integer(required=False)
+                denoise_sigma = fields.Integer(required=False)
+                mask_dilation_offset = fields.Integer(required=False)
+                ignore_bubble = fields.Integer(required=False)
+                gpt_config = fields.String(required=False)
+                filter_text = fields.String(required=False)
+
+                # api specific
+                overlay_ext = fields.Str(required=False)
+                base64Images = fields.Raw(required=False)
+                image = fields.Raw(required=False)
+                url = fields.Raw(required=False)
+
+                # no functionality except preventing errors when given
+                fingerprint = fields.Raw(required=False)
+                clientUuid = fields.Raw(required=False)
+
+            cls._post_schema = PostSchema()
+        return cls._post_schema
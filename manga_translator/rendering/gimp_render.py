@@ -68,22 +68,33 @@ script_template = """
 
 
 def gimp_render(out_file, ctx: Context):
-    input_file = os.path.join(tempfile.gettempdir(), ".gimp_input.png")
-    mask_file = os.path.join(tempfile.gettempdir(), ".gimp_mask.png")
+    # Unique temp files per call, saves can run concurrently on the writer threads
+    input_fd, input_file = tempfile.mkstemp(prefix=".gimp_input", suffix=".png")
+    mask_fd, mask_file = tempfile.mkstemp(prefix=".gimp_mask", suffix=".png")
+    os.close(input_fd)
+    os.close(mask_fd)
+    try:
+        _gimp_render(out_file, ctx, input_file, mask_file)
+    finally:
+        os.unlink(input_file)
+        os.unlink(mask_file)
+
 
+def _gimp_render(out_file, ctx: Context, input_file, mask_file):
     extension = out_file.split(".")[-1]
 
     ctx.upscaled.save(input_file)
 
     # If there is no text on the page, gimp_mask will be None and there is no
-    # need to add it as a layer.
+    # need to add it as a layer. ctx is left untouched as the caller still reads it.
     if ctx.gimp_mask is not None:
         cv2.imwrite(mask_file, ctx.gimp_mask)
+        text_regions = ctx.text_regions
     else:
-        ctx.text_regions = []
+        text_regions = []
 
     filtered_text_regions = [
-        text_region for text_region in ctx.text_regions if text_region.translation != ""
+        text_region for text_region in text_regions if text_region.translation != ""
     ]
 
     text_init = "\n".join(
@@ -142,13 +153,6 @@ def gimp_render(out_file, ctx: Context):
 
     gimp_batch(full_script)
 
-    # Delete Files
-    os.unlink(input_file)
-
-    # Deleting file only if it exists
-    if os.path.exists(mask_file):
-        os.unlink(mask_file)
-
 
 def gimp_console_executable():
     executable = "gimp"
@@ -20,6 +20,7 @@ import torch.nn.functional as F
 import numpy as np
 
 from .common import OfflineUpscaler
+from ..utils import amp_autocast
 
 ####################
 # RRDBNet Generator
@@ -539,8 +540,8 @@ class ESRGANUpscalerPytorch(OfflineUpscaler):
         ratio = upscale_ratio / 4
         if image_batch :
             batch = torch.cat([einops.rearrange(torch.from_numpy(np.array(img.convert('RGB'))[:,:,::-1].copy()).float() / 255.0, 'h w c -> 1 c h w') for img in image_batch], dim = 0).to(self.device)
-            with torch.no_grad() :
-                ret = self.model(batch)
+            with torch.inference_mode(), amp_autocast(self.device) :
+                ret = self.model(batch).float()
             ret: torch.Tensor
             ret: List[Image.Image] = [Image.fromarray((einops.rearrange(img.clip(0, 1), 'c h w -> h w c').cpu().numpy()[:,:,::-1].copy() * 255.0).astype(np.uint8)) for img in ret]
             ret = [img.resize(size = (int(round(img.size[0] * ratio)), int(round(img.size[1] * ratio))), resample = Image.Resampling.BILINEAR) for img in ret]
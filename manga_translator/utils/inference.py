@@ -1,3 +1,4 @@
+import asyncio
 import os
 import stat
 import sys
@@ -6,7 +7,9 @@ import re
 import torch
 import shutil
 import filecmp
+import threading
 from abc import ABC, abstractmethod
+from contextlib import nullcontext
 from functools import cached_property
 
 from .generic import (
@@ -21,6 +24,45 @@ from .generic import (
 from .log import get_logger
 
 
+# Models are downloaded concurrently, so only one of them may ask on stdin at a time
+_PROMPT_LOCK = threading.Lock()
+
+# Pinned staging buffers for `to_device`, keyed by (device, dtype) and holding (buffer, copy event)
+_PINNED_BUFFERS = {}
+
+def to_device(tensor: torch.Tensor, device: str) -> torch.Tensor:
+    '''
+    Moves a host tensor onto the device. For cuda devices the tensor is staged through a reused
+    pinned buffer, so the copy runs asynchronously instead of blocking on a pageable transfer.
+    '''
+    if not device.startswith('cuda'):
+        return tensor.to(device)
+    key = (device, tensor.dtype)
+    buffer, event = _PINNED_BUFFERS.get(key, (None, None))
+    if event is not None:
+        # The previous copy out of the buffer has to finish before it can be overwritten
+        event.synchronize()
+    if buffer is None or buffer.numel() < tensor.numel():
+        buffer = torch.empty(tensor.numel(), dtype=tensor.dtype, pin_memory=True)
+    staging = buffer[:tensor.numel()].view(tensor.shape)
+    staging.copy_(tensor)
+    tensor = staging.to(device, non_blocking=True)
+    event = torch.cuda.Event()
+    event.record()
+    _PINNED_BUFFERS[key] = (buffer, event)
+    return tensor
+
+def amp_autocast(device: str):
+    '''
+    Returns the context to run a forward pass in. With --amp the pass runs under fp16 autocast on cuda
+    devices, otherwise the model precision is left untouched. Must be entered around the forward call
+    itself, since autocast state is thread local and would leak into other coroutines if held across awaits.
+    '''
+    if ModelWrapper._AMP and device.startswith('cuda'):
+        return torch.autocast(device_type='cuda', dtype=torch.float16)
+    return nullcontext()
+
+
 class InfererModule(ABC):
     def __init__(self):
         self.logger = get_logger(self.__class__.__name__)
@@ -95,6 +137,10 @@ class ModelWrapper(ABC):
     _MODEL_SUB_DIR = ''
     _MODEL_MAPPING = {}
     _KEY = ''
+    # Set through --compile-models
+    _COMPILE_MODELS = False
+    # Set through --amp, see `amp_autocast`
+    _AMP = False
 
     def __init__(self):
         os.makedirs(self.model_dir, exist_ok=True)
@@ -116,6 +162,15 @@ class ModelWrapper(ABC):
     def _get_file_path(self, *args) -> str:
         return os.path.join(self.model_dir, *args)
 
+    def _compile(self, model: torch.nn.Module, device: str) -> torch.nn.Module:
+        '''
+        Compiles the model with `torch.compile` if enabled. The `reduce-overhead` mode captures
+        cuda graphs for every input shape, removing per kernel launch overhead on repeated forwards.
+        '''
+        if not self._COMPILE_MODELS or not device.startswith('cuda'):
+            return model
+        return torch.compile(model, mode='reduce-overhead', fullgraph=False)
+
     def _get_used_gpu_memory(self) -> bool:
         '''
         Gets the total amount of GPU memory used by model (Can be used in the future
@@ -137,11 +192,11 @@ class ModelWrapper(ABC):
 
     async def _download_file(self, url: str, path: str):
         print(f' -- Downloading: "{url}"')
-        download_url_with_progressbar(url, path)
+        await asyncio.get_running_loop().run_in_executor(None, download_url_with_progressbar, url, path)
 
     async def _verify_file(self, sha256_pre_calculated: str, path: str):
         print(f' -- Verifying: "{path}"')
-        sha256_calculated = get_digest(path).lower()
+        sha256_calculated = (await asyncio.get_running_loop().run_in_executor(None, get_digest, path)).lower()
         sha256_pre_calculated = sha256_pre_calculated.lower()
 
         if sha256_calculated != sha256_pre_calculated:
@@ -170,10 +225,15 @@ class ModelWrapper(ABC):
                     self._downloaded = True
                     break
                 except ModelVerificationException:
-                    if not prompt_yes_no('Failed to verify signature. Do you want to restart the download?', default=True):
+                    restart = await asyncio.get_running_loop().run_in_executor(None, self._prompt_restart_download)
+                    if not restart:
                         print('Aborting.', end='')
                         raise KeyboardInterrupt()
 
+    def _prompt_restart_download(self) -> bool:
+        with _PROMPT_LOCK:
+            return prompt_yes_no(f'Failed to verify signature of {self._key}. Do you want to restart the download?', default=True)
+
     async def _download(self):
         '''
         Downloads models as defined in `_MODEL_MAPPING`. Can be overwritten (together
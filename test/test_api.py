@@ -0,0 +1,37 @@
+import os
+import sys
+import base64
+import binascii
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from manga_translator.manga_translator import _Base64ChunkDecoder
+
+
+def decode_chunks(chunks):
+    decoder = _Base64ChunkDecoder()
+    return b''.join(decoder.decode(chunk) for chunk in chunks) + decoder.flush()
+
+def split_every(data: bytes, n: int):
+    return [data[i:i + n] for i in range(0, len(data), n)]
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 4, 5, 7, 64])
+def test_base64_chunk_decoder(chunk_size):
+    data = bytes(range(256)) * 3 + b'tail'
+    encoded = base64.b64encode(data)
+    assert decode_chunks(split_every(encoded, chunk_size)) == data
+
+def test_base64_chunk_decoder_line_breaks():
+    data = bytes(range(200))
+    # MIME style base64 wraps lines at 76 characters
+    encoded = base64.encodebytes(data).replace(b'\n', b'\r\n')
+    assert decode_chunks(split_every(encoded, 10)) == data
+
+def test_base64_chunk_decoder_empty():
+    assert decode_chunks([]) == b''
+    assert decode_chunks([b'', b'\r\n']) == b''
+
+def test_base64_chunk_decoder_invalid():
+    with pytest.raises(binascii.Error):
+        decode_chunks([b'abcde'])
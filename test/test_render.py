@@ -9,6 +9,7 @@ pytest_plugins = ('pytest_asyncio')
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from manga_translator.rendering import dispatch as dispatch_rendering, dispatch_eng_render
+from manga_translator.manga_translator import _ws_render_mask, _ws_masked_rgba
 from manga_translator.utils import (
     TextBlock,
     visualize_textblocks,
@@ -49,3 +50,23 @@ async def test_default_renderer():
 
     img_rendered = await dispatch_rendering(img, regions, hyphenate=False)
     save_result('default1.png', img_rendered, regions)
+
+def test_ws_masked_rgba():
+    rng = np.random.default_rng(0)
+    img_rgb = rng.integers(0, 256, (64, 48, 3), dtype=np.uint8)
+    output = img_rgb.copy()
+    output[10:20, 5:30] = rng.integers(0, 256, (10, 25, 3), dtype=np.uint8)
+    # Single changed channel, must be kept even though the other two match
+    output[40, 40, 1] ^= 1
+    mask = np.zeros((64, 48), dtype=np.uint8)
+    mask[30:50, 0:10] = 200
+    mask[50:55, 0:10] = 126
+
+    render_mask = _ws_render_mask(mask, img_rgb, output, np.empty(output.shape, bool), np.empty((64, 48), bool))
+    expected_mask = (mask >= 127).astype(np.uint8)[:, :, None]
+    expected_mask[np.sum(img_rgb != output, axis=2) > 0] = 1
+    assert render_mask.dtype == np.uint8
+    assert np.array_equal(render_mask, expected_mask)
+
+    rgba = _ws_masked_rgba(output, render_mask)
+    assert np.array_equal(rgba, cv2.cvtColor(output, cv2.COLOR_RGB2RGBA) * expected_mask)
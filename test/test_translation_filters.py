@@ -0,0 +1,26 @@
+import os
+import sys
+import re
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from manga_translator.manga_translator import MangaTranslator
+from manga_translator.utils import Context
+
+
+def test_case_fn():
+    assert MangaTranslator._case_fn(Context(uppercase=True))('Hello There') == 'HELLO THERE'
+    assert MangaTranslator._case_fn(Context(lowercase=True))('Hello There') == 'hello there'
+    assert MangaTranslator._case_fn(Context()) is None
+
+def test_should_keep():
+    assert MangaTranslator._should_keep(' Hello ', 'こんにちは') == (True, 'Hello')
+    # Numbers and translations equal to their source are filtered out
+    assert MangaTranslator._should_keep('123', 'こんにちは') == (False, '123')
+    assert MangaTranslator._should_keep('Hello', ' hello ') == (False, 'Hello')
+    assert MangaTranslator._should_keep('Hello', 'hello', compare_source=False) == (True, 'Hello')
+
+def test_should_keep_filter_text():
+    filter_search = re.compile('^Chapter').search
+    assert MangaTranslator._should_keep('Chapter 3', 'こんにちは', filter_search)[0] is False
+    assert MangaTranslator._should_keep('The Chapter', 'こんにちは', filter_search)[0] is True